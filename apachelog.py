@@ -3,35 +3,336 @@
 # Parse an apache log file into a sequence of dictionaries
 
 from fieldmap import *
+from apachetime import apache_epoch
 
 import re
+from array import array
+from itertools import islice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 logpats  = r'(\S+) (\S+) (\S+) \[(.*?)\] ' \
            r'"(\S+) (\S+) (\S+)" (\S+) (\S+)'
 
 logpat   = re.compile(logpats)
 
-def apache_log(lines):
+colnames = ('host','referrer','user','datetime',
+            'method', 'request','proto','status','bytes')
+
+# A compact record with a slot per column, for when a dict per line
+# costs too much.  Fields can be read as attributes (r.status) or by
+# name as with the dictionaries (r['status']), and r['epoch'] gives the
+# datetime in seconds as add_epoch() would.  Records compare equal to
+# records or dicts with the same columns.  Like dicts they can be
+# changed, so they can't be hashed.
+
+columnkeys = frozenset(colnames)
+recordkeys = frozenset(colnames + ('epoch',))
+
+class LogRecord(object):
+    __slots__ = colnames
+    def __init__(self,host,referrer,user,datetime,
+                 method,request,proto,status,bytes):
+        self.host     = host
+        self.referrer = referrer
+        self.user     = user
+        self.datetime = datetime
+        self.method   = method
+        self.request  = request
+        self.proto    = proto
+        self.status   = status
+        self.bytes    = bytes
+    def __getitem__(self,name):
+        if name not in recordkeys:
+            raise KeyError(name)
+        return getattr(self,name)
+    def __setitem__(self,name,value):
+        if name not in columnkeys:
+            raise KeyError(name)
+        setattr(self,name,value)
+    @property
+    def epoch(self):
+        return apache_epoch(self.datetime)
+    def get(self,name,default=None):
+        if name not in recordkeys:
+            return default
+        return getattr(self,name)
+    def __contains__(self,name):
+        return name in recordkeys
+    def __iter__(self):
+        return iter(colnames)
+    def keys(self):
+        return list(colnames)
+    def values(self):
+        return [getattr(self,name) for name in colnames]
+    def items(self):
+        return zip(colnames,self.values())
+    def __eq__(self,other):
+        if not isinstance(other,(LogRecord,dict)):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+    def __ne__(self,other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+    __hash__ = None
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__,
+                           ", ".join("%s=%r" % item
+                                     for item in self.items()))
+    def __reduce__(self):
+        return (LogRecord, tuple(self.values()))
+
+# A record that keeps the regex match for its line and only pulls a
+# field out of the line (and converts it) the first time it's asked
+# for.  The value is then kept in the field's slot, so later accesses
+# cost the same as on a LogRecord.
+
+colindex = dict((name, i+1) for i, name in enumerate(colnames))
+
+class LazyRecord(LogRecord):
+    __slots__ = ('match',)
+    def __init__(self,match):
+        self.match = match
+    @classmethod
+    def from_match(cls,match):
+        return cls(match)
+    def __getattr__(self,name):
+        # Only called when the slot hasn't been filled in yet
+        try:
+            value = self.match.group(colindex[name])
+        except KeyError:
+            raise AttributeError(name)
+        if name == 'status':
+            value = int(value)
+        elif name == 'bytes':
+            value = int(value) if value != '-' else 0
+        setattr(self,name,value)
+        return value
+
+# The status and bytes columns split off the end of a line, or None if
+# the end of the line can't be trusted to hold them.  A line with more
+# than the request's two quotes (the combined format, or a quote in
+# another field) could have something else at the end, so it's None.
+# Every line logpat accepts that gets a tuple gets the same values the
+# regex gives.
+
+def split_tail(line):
+    if line.count('"') != 2:
+        return None
+    p = line.rstrip('\n').rsplit(' ',3)
+    if (len(p) == 4 and p[1][-1:] == '"' and p[2].isdigit() and
+        (p[3].isdigit() or p[3] == '-')):
+        return p[2], p[3]
+
+# Projection.  When only a few columns are wanted, build dictionaries
+# holding just those.  Lines are still matched with logpat, so exactly
+# the same lines come back as from a full parse whatever the fields;
+# only the unwanted columns are never copied or converted.  (Splitting
+# the line instead is only safe after checking its whole shape, and
+# on CPython that is slower than the regex.)
+
+def bytes_value(s):
+    return int(s) if s != '-' else 0
+
+converters = { 'status' : 'int', 'bytes' : 'bytes_value' }
+
+projection_template = """
+def project_log(lines):
+    for line in lines:
+        g = match(line)
+        if g:
+            t = g.groups()
+            yield {%s}
+"""
+
+projections = {}
+
+def make_projection(fields):
+    # Generates a parser specialised for the given fields
+    entries = ", ".join("%r : %s" % (name, name in converters and
+                                     "%s(t[%d])" % (converters[name],i) or
+                                     "t[%d]" % i)
+                        for name, i in ((name, colnames.index(name))
+                                        for name in fields))
+    namespace = { 'match' : logpat.match, 'bytes_value' : bytes_value }
+    exec projection_template % entries in namespace
+    return namespace['project_log']
+
+def project_log(lines, fields):
+    fields = tuple(fields)
+    project = projections.get(fields)
+    if project is None:
+        project = projections[fields] = make_projection(fields)
+    return project(lines)
+
+def drop_fields(log, names):
+    for r in log:
+        for name in names:
+            del r[name]
+        yield r
+
+def apache_log(lines, record=dict, fields=None, where=None):
+    if fields and record is not dict:
+        raise ValueError("fields= gives dictionaries, so record= "
+                         "can't be used with it")
+    if where:
+        # Predicates from logfilter.py.  Drop lines with their cheap
+        # raw tests, then check the parsed records exactly.
+        # A projection also needs the predicates' columns, which are
+        # dropped again once the records have been checked.
+        from logfilter import raw_filter, record_filter
+        extra = []
+        if fields:
+            for p in where:
+                if p.name not in fields and p.name not in extra:
+                    extra.append(p.name)
+            fields = list(fields) + extra
+        lines = raw_filter(lines,where)
+        log   = record_filter(apache_log(lines,record,fields),where)
+        return drop_fields(log,extra) if extra else log
+
+    if fields:
+        # Dictionaries holding only the named columns
+        return project_log(lines,fields)
+
     groups = (logpat.match(line) for line in lines)
     tuples = (g.groups() for g in groups if g)
-    
-    colnames = ('host','referrer','user','datetime',
-            'method', 'request','proto','status','bytes')
+
+    if hasattr(record,'from_match'):
+        return (record.from_match(g) for g in groups if g)
+
+    if record is not dict:
+        # Any other record type is called with the column values,
+        # status and bytes already converted to ints
+        return (record(host,referrer,user,datetime,method,request,proto,
+                       int(status),int(bytes) if bytes != '-' else 0)
+                for (host,referrer,user,datetime,
+                     method,request,proto,status,bytes) in tuples)
 
     log      = (dict(zip(colnames,t)) for t in tuples)
     log      = field_map(log,"status",int)
-    log      = field_map(log,"bytes",
-                         lambda s: int(s) if s != '-' else 0)
+    log      = field_map(log,"bytes",bytes_value)
 
     return log
 
+# A batch of log records stored column by column.  status and bytes
+# are array('l')s and the other columns are lists, so sums, maxima and
+# filters run over a whole batch at once.  If NumPy is installed,
+# array(name) gives a NumPy view of an integer column without copying.
+
+class LogColumns(object):
+    def __init__(self,columns):
+        (self.host,self.referrer,self.user,self.datetime,
+         self.method,self.request,self.proto,status,bytes) = columns
+        self.status = array('l',map(int,status))
+        self.bytes  = array('l',map(bytes_value,bytes))
+    __getitem__ = object.__getattribute__
+    def __len__(self):
+        return len(self.status)
+    def array(self,name):
+        if numpy is None:
+            raise RuntimeError("array() requires NumPy")
+        column = getattr(self,name)
+        if not column:
+            return numpy.zeros(0,dtype=numpy.int_)
+        return numpy.frombuffer(column,dtype=numpy.int_)
+    def records(self,record=LogRecord):
+        return (record(*row) for row in zip(*[getattr(self,name)
+                                               for name in colnames]))
+
+def apache_columns(lines, size=4096):
+    match = logpat.match
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines,size))
+        if not chunk: break
+        tuples = [g.groups() for g in map(match,chunk) if g]
+        if tuples:
+            yield LogColumns(zip(*tuples))
+
 # Example use:
 
 if __name__ == '__main__':
+    # split_tail() must agree with the regex on every line it accepts
+    odd = ['1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 -',
+           '1.2.3.4  - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00] "GET /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 12 "-" "Mozilla"\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 12\t\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00\t-0600] "GET /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00] -0600] "GET /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x" 200 12\n',
+           '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "" /x HTTP/1.1" 200 12\n',
+           '1.2.3.4 - - [ -0600] "GET /x HTTP/1.1" 200 12\n',
+           'garbage\n', '\n', '']
+    methods = ['GET','POST','HEAD']
+    good = ['10.0.%d.%d - %s [24/Feb/2008:00:%02d:00 -0600] '
+            '"%s /p%d HTTP/1.%d" %d %s\n'
+            % (i % 7, i, i % 3 and '-' or 'bob', i % 60, methods[i % 3],
+               i, i % 2, (200,304,404)[i % 3], i % 5 and str(i*37) or '-')
+            for i in range(100)]
+    for line in odd + good + ['1.2.3.4 - - [x] "GET /x HTTP/1.1" 200 900 "-" 7 9\n']:
+        g = logpat.match(line)
+        if g: assert split_tail(line) in (None, g.groups()[7:]), line
+    assert None not in map(split_tail,good)
+
+    # A projection must give the same rows as the full parse
+    odd += ['1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "-" 408 -\n',
+            '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "\x16\x03\x01" 400 226\n']
+    full = list(apache_log(odd + good))
+    for fields in (['host'],['status'],['bytes'],['host','status'],
+                   ['request'],['bytes','status'],list(colnames)):
+        assert list(apache_log(odd + good,fields=fields)) == \
+               [dict((name, r[name]) for name in fields) for r in full], fields
+    from logfilter import field_is
+    assert list(apache_log(odd + good,fields=['host'],
+                           where=[field_is('status',404)])) == \
+           [{'host' : r['host']} for r in full if r['status'] == 404]
+    try:
+        apache_log(good,LogRecord,fields=['bytes'])
+        assert False
+    except ValueError:
+        pass
+
+    # Records stand in for the dicts
+    import pickle
+    for record in (LogRecord, LazyRecord):
+        r = next(apache_log(good,record))
+        assert r == full[-100] and r != None and r not in [None, 5]
+        assert pickle.loads(pickle.dumps(r)) == r
+        assert 'epoch' in r and r['epoch'] == apache_epoch(r['datetime'])
+        for name in ('keys','__class__','match'):
+            assert r.get(name) is None and r.get(name,5) == 5, name
+            try:
+                r[name]
+                assert False, name
+            except KeyError:
+                pass
+        for name in ('newkey','epoch'):
+            try:
+                r[name] = 1
+                assert False, name
+            except KeyError:
+                pass
+        r['bytes'] = 7
+        assert r.get('bytes') == 7
+
     from linesdir import *
     lines = lines_from_dir("access-log*","www")
     log = apache_log(lines)
     for r in log:
         print r
 
+    # Or, only the columns needed
+    lines = lines_from_dir("access-log*","www")
+    print "Total", sum(r['bytes'] for r in apache_log(lines,fields=['bytes']))
+
+    # Or, a batch of columns at a time
+    lines = lines_from_dir("access-log*","www")
+    print "Total", sum(sum(batch.bytes)
+                       for batch in apache_columns(lines))
 
@@ -0,0 +1,61 @@
+# apachetime.py
+#
+# Convert Apache timestamps like '10/Oct/2000:13:55:36 -0700' into
+# seconds since the epoch (UTC).
+#
+# Consecutive log lines nearly always fall in the same minute, so the
+# epoch of each minute (together with its timezone) is cached and only
+# the seconds are added per line.
+
+import re
+import calendar
+
+months = {'Jan' : 1, 'Feb' : 2, 'Mar' : 3, 'Apr' : 4, 'May' : 5,
+          'Jun' : 6, 'Jul' : 7, 'Aug' : 8, 'Sep' : 9, 'Oct' : 10,
+          'Nov' : 11, 'Dec' : 12 }
+
+datepat = re.compile(r'(\d\d)/(\w{3})/(\d{4}):(\d\d):(\d\d):(\d\d) '
+                     r'([-+])(\d\d)(\d\d)$')
+
+minute_cache = {}
+
+def minute_epoch(datetime):
+    m = datepat.match(datetime)
+    if not m or m.group(2) not in months:
+        raise ValueError("bad Apache timestamp %r" % datetime)
+    day, mon, year, hour, minute, second, sign, tzh, tzm = m.groups()
+    offset = int(tzh)*3600 + int(tzm)*60
+    if sign == '-':
+        offset = -offset
+    return calendar.timegm((int(year),months[mon],int(day),
+                            int(hour),int(minute),0)) - offset
+
+def apache_epoch(datetime):
+    key  = datetime[:17] + datetime[20:]
+    base = minute_cache.get(key)
+    if base is None:
+        base = minute_epoch(datetime)
+        if len(minute_cache) > 100000:
+            minute_cache.clear()
+        minute_cache[key] = base
+    return base + int(datetime[18:20])
+
+def add_epoch(log):
+    for r in log:
+        # Records such as apachelog's LogRecord have an epoch already
+        if not hasattr(type(r),'epoch'):
+            r['epoch'] = apache_epoch(r['datetime'])
+        yield r
+
+# Example use
+
+if __name__ == '__main__':
+    from apachelog import *
+    line = '1.2.3.4 - - [24/Feb/2008:00:01:02 -0600] "GET / HTTP/1.1" 200 5\n'
+    for record in (dict, LogRecord, LazyRecord):
+        r, = add_epoch(apache_log([line],record))
+        assert r['epoch'] == 1203832862, record
+
+    log = add_epoch(apache_log(open("access-log")))
+    for r in log:
+        print r['epoch'], r['datetime']
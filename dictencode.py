@@ -0,0 +1,57 @@
+# dictencode.py
+#
+# Dictionary-encode columns of log records.  Each distinct value of a
+# column is given a small integer code the first time it's seen, and
+# records carry the code instead of their own copy of the string.
+# Sets, groupings and comparisons then work on ints, and every
+# repeated host or request shares a single string in the table.
+
+from array import array
+from fieldmap import *
+
+class Dictionary(object):
+    def __init__(self):
+        self.codes  = {}
+        self.values = []
+    def encode(self,value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+    def decode(self,code):
+        return self.values[code]
+    def __len__(self):
+        return len(self.values)
+
+def dict_encode(log, names, dicts):
+    # dicts maps column names to Dictionary objects.  One is added for
+    # any column that doesn't have one yet.
+    for name in names:
+        d = dicts.setdefault(name,Dictionary())
+        log = field_map(log,name,d.encode)
+    return log
+
+def dict_encode_columns(batches, names, dicts):
+    # The same for apache_columns() batches.  Each encoded column
+    # becomes an array('l') of codes.
+    encoders = [(name, dicts.setdefault(name,Dictionary()).encode)
+                for name in names]
+    for batch in batches:
+        for name, encode in encoders:
+            setattr(batch,name,array('l',map(encode,getattr(batch,name))))
+        yield batch
+
+# Example use.  hosts.py with the hosts encoded as ints.
+
+if __name__ == '__main__':
+    from linesdir import *
+    from apachelog import *
+
+    dicts = {}
+    lines = lines_from_dir("access-log*","www")
+    log   = dict_encode(apache_log(lines,LogRecord),["host"],dicts)
+
+    hosts = set(r.host for r in log)
+    for h in hosts:
+        print dicts["host"].decode(h)
@@ -12,6 +12,116 @@ def follow(thefile):
             continue
         yield line
 
+# Follow a file by name like tail -F.  Instead of polling, wait on an
+# inotify watch of the file's directory so that new data is seen as
+# soon as it's written.  If the file is renamed away (logrotate) or
+# truncated, the rest of the old file is read and then the file is
+# reopened from the start.  Without inotify, this falls back to
+# polling every 0.1 seconds.  Closing the generator closes the file
+# and the inotify descriptor.
+
+import os
+import inotify
+
+def make_waiter(filename, timeout=1.0):
+    # Returns a function that waits for a change and a function that
+    # releases the watch
+    if not inotify.available:
+        return (lambda: time.sleep(0.1)), (lambda: None)
+    watcher = inotify.Inotify()
+    try:
+        watcher.add_watch(os.path.dirname(filename) or ".",
+                          inotify.IN_MODIFY | inotify.IN_CREATE |
+                          inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+                          inotify.IN_DELETE)
+    except OSError:
+        watcher.close()
+        raise
+    # The timeout is a safety net in case an event gets missed
+    return (lambda: watcher.wait(timeout)), watcher.close
+
+def replaced(thefile, filename):
+    # True if filename now names a different file.  Rewinds thefile
+    # if it has been truncated.
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return False
+    if st.st_ino != os.fstat(thefile.fileno()).st_ino:
+        return True
+    if st.st_size < thefile.tell():
+        thefile.seek(0)
+    return False
+
+def follow_name(filename):
+    wait, close = make_waiter(filename)
+    thefile = None
+    try:
+        thefile = open(filename)
+        thefile.seek(0,2)
+        partial = ""
+        while True:
+            line = thefile.readline()
+            if line:
+                if not line.endswith("\n"):
+                    partial += line
+                    continue
+                yield partial + line
+                partial = ""
+                continue
+            if replaced(thefile,filename):
+                # Whatever was written to the old file after it was
+                # moved, then switch over to the new one
+                for line in thefile:
+                    yield partial + line
+                    partial = ""
+                if partial:
+                    yield partial
+                    partial = ""
+                thefile.close()
+                thefile = open(filename)
+                continue
+            wait()
+    finally:
+        close()
+        if thefile: thefile.close()
+
+# Follow a busy file by reading everything appended since the last
+# check with os.read() and splitting it into lines, rather than calling
+# readline() once per line.  A partial last line is carried over to the
+# next read.  With batch=True, each read produces a list of lines.
+# Closing the generator closes thefile and the inotify descriptor.
+
+import cStringIO
+
+def follow_bulk(thefile, batch=False, blocksize=1<<20):
+    thefile.seek(0,2)
+    fd = thefile.fileno()
+    wait, close = make_waiter(thefile.name)
+    partial = ""
+    try:
+        while True:
+            chunks = []
+            while True:
+                data = os.read(fd,blocksize)
+                chunks.append(data)
+                if len(data) < blocksize: break
+            data = partial + "".join(chunks)
+            end = data.rfind("\n") + 1
+            partial = data[end:]
+            if not end:
+                wait()
+                continue
+            lines = cStringIO.StringIO(data[:end]).readlines()
+            if batch:
+                yield lines
+            else:
+                for line in lines:
+                    yield line
+    finally:
+        close()
+        thefile.close()
+
 # Example use
 # Note : This example requires the use of an apache log simulator.
 # 
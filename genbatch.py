@@ -0,0 +1,75 @@
+# genbatch.py
+#
+# Batch-at-a-time versions of gen_cat, gen_grep, field_map and
+# apache_log.  Each stage passes a list of a few thousand lines or
+# records to the next, so the cost of resuming a generator is paid once
+# per batch instead of once per line.  The per-item generators remain
+# the reference; a batch pipeline produces the same items.
+
+import re
+from itertools import islice
+from apachelog import logpat
+
+def gen_batches(items, size=4096):
+    items = iter(items)
+    while True:
+        batch = list(islice(items,size))
+        if not batch: break
+        yield batch
+
+def batch_cat(sources, size=4096):
+    for s in sources:
+        for batch in gen_batches(s,size):
+            yield batch
+
+def batch_grep(pat, batches):
+    patc = re.compile(pat)
+    for batch in batches:
+        batch = filter(patc.search,batch)
+        if batch: yield batch
+
+def batch_field_map(batches, name, func):
+    for batch in batches:
+        for d in batch:
+            d[name] = func(d[name])
+        yield batch
+
+def batch_apache_log(batches):
+    # Same records as apache_log(), with the status and bytes
+    # conversions done while each record is built
+    match = logpat.match
+    for batch in batches:
+        log = []
+        for g in map(match,batch):
+            if not g: continue
+            host,referrer,user,datetime,method,request,proto,status,bytes = \
+                g.groups()
+            log.append({ 'host' : host, 'referrer' : referrer,
+                         'user' : user, 'datetime' : datetime,
+                         'method' : method, 'request' : request,
+                         'proto' : proto, 'status' : int(status),
+                         'bytes' : int(bytes) if bytes != '-' else 0 })
+        yield log
+
+def unbatch(batches):
+    for batch in batches:
+        for item in batch:
+            yield item
+
+# Example use.  bytesgen.py, a batch at a time.
+
+if __name__ == '__main__':
+    from genfind import *
+    from genopen import *
+
+    pat    = r'ply-.*\.gz'
+    logdir = 'www'
+
+    filenames = gen_find("access-log*",logdir)
+    logfiles  = gen_open(filenames)
+    batches   = batch_cat(logfiles)
+    patlines  = batch_grep(pat,batches)
+    bytecol   = ([line.rsplit(None,1)[1] for line in b] for b in patlines)
+    bytes     = (sum(int(x) for x in b if x != '-') for b in bytecol)
+
+    print "Total", sum(bytes)
@@ -1,16 +1,138 @@
 # gengrep.py
 #
 # Grep a sequence of lines that match a re pattern
+#
+# If the pattern contains a run of literal characters that every match
+# must include (like 'ply-' in r'ply-.*\.gz'), a substring test on that
+# literal is done first, as in robotsfast.py, and the regex is only run
+# on lines that pass it.
 
 import re
+import sre_parse
+from sre_constants import LITERAL, GROUPREF, GROUPREF_EXISTS
+
+def required_literal(patc):
+    # The longest run of literal characters at the top level of a
+    # pattern.  Only found for case-sensitive patterns.
+    if patc.flags & re.IGNORECASE:
+        return ''
+    parsed = sre_parse.parse(patc.pattern,patc.flags)
+    if parsed.pattern.flags & re.IGNORECASE:
+        return ''
+    tochar = unichr if isinstance(patc.pattern,unicode) else chr
+    runs, run = [], []
+    for op, av in parsed:
+        if op == LITERAL:
+            run.append(tochar(av))
+        elif run:
+            runs.append(''.join(run))
+            run = []
+    runs.append(''.join(run))
+    return max(runs,key=len)
+
 def gen_grep(pat,lines):
     patc = re.compile(pat)
+    literal = required_literal(patc)
+    if literal:
+        for line in lines:
+            if literal in line and patc.search(line): yield line
+    else:
+        for line in lines:
+            if patc.search(line): yield line
+
+# Classify lines against many patterns with combined regexes.  pats
+# is a sequence of (name, pattern) pairs.  For each line that matches,
+# (name, line) is produced for the pattern whose match starts furthest
+# left, the first listed one winning a tie.  Python 2's re allows at
+# most 100 groups in a pattern (one per pattern here, plus any groups
+# the patterns contain), so the patterns are split over as many
+# combined regexes as it takes.
+#
+# Wrapping each pattern in a group renumbers the groups inside it, so
+# a pattern with a backreference (r'(x)\1'), a named group (names
+# would clash) or inline flags (which would apply to every pattern)
+# can't go into a combined regex.  Those are searched on their own.
+
+maxgroups = 99
+
+def subpatterns(av):
+    # The SubPatterns inside an sre_parse argument
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for a in av:
+            for sub in subpatterns(a):
+                yield sub
+
+def has_groupref(parsed):
+    for op, av in parsed:
+        if op in (GROUPREF, GROUPREF_EXISTS):
+            return True
+        for sub in subpatterns(av):
+            if has_groupref(sub):
+                return True
+    return False
+
+def combinable(parsed):
+    return not (parsed.pattern.flags or parsed.pattern.groupdict or
+                has_groupref(parsed))
+
+def gen_classify(pats,lines):
+    # searches holds (search, index) pairs.  The index is None for a
+    # combined regex, whose match says which pattern it was.
+    names = [name for name, pat in pats]
+    searches, chunks, chunk, ngroups = [], [], [], 0
+    for i, (name, pat) in enumerate(pats):
+        parsed = sre_parse.parse(pat)
+        if not combinable(parsed):
+            searches.append((re.compile(pat).search, i))
+            continue
+        # The pattern's own groups plus the one wrapped around it
+        n = parsed.pattern.groups
+        if chunk and ngroups + n > maxgroups:
+            chunks.append(chunk)
+            chunk, ngroups = [], 0
+        chunk.append((i,pat))
+        ngroups += n
+    if chunk:
+        chunks.append(chunk)
+    for chunk in chunks:
+        combined = '|'.join('(?P<_%d>%s)' % (i,pat) for i, pat in chunk)
+        searches.append((re.compile(combined).search, None))
+
+    if len(searches) == 1 and searches[0][1] is None:
+        search = searches[0][0]
+        for line in lines:
+            m = search(line)
+            if m: yield names[int(m.lastgroup[1:])], line
+        return
     for line in lines:
-        if patc.search(line): yield line
+        best = None
+        for search, i in searches:
+            m = search(line)
+            if m:
+                found = (m.start(), int(m.lastgroup[1:]) if i is None else i)
+                if best is None or found < best:
+                    best = found
+        if best: yield names[best[1]], line
 
 # Example use
 
 if __name__ == '__main__':
+    pats = [('echo', r'(x)\1'), ('ab', r'(a)(b)\2'), ('word', r'\bw\w+'),
+            ('named', r'(?P<n>n)(?P=n)'), ('caps', r'(?i)CAPS'), ('num', r'\d+')]
+    lines = ['axx\n', 'abb\n', 'ab\n', 'a word\n', 'nn\n', 'caps\n', '12 xx\n', '-\n']
+    assert list(gen_classify(pats,lines)) == \
+           [('echo','axx\n'), ('ab','abb\n'), ('word','a word\n'),
+            ('named','nn\n'), ('caps','caps\n'), ('num','12 xx\n')]
+
+    # More groups than one regex can hold
+    many = [('p%d' % i, r'(k%d)\b' % i) for i in range(150)]
+    lines = ['k%d\n' % i for i in range(0,150,7)] + ['k1 k0\n', 'k149 k3\n']
+    assert list(gen_classify(many,lines)) == \
+           [('p%d' % i, 'k%d\n' % i) for i in range(0,150,7)] + \
+           [('p1','k1 k0\n'), ('p149','k149 k3\n')]
+
     from genfind import  gen_find
     from genopen import  gen_open
     from gencat  import  gen_cat
@@ -0,0 +1,46 @@
+# genmmap.py
+#
+# Generate lines from a memory-mapped file.  Lines are byte slices
+# taken straight out of the mapping, and a literal filter can be
+# applied to the mapped data before any line is cut out of it.
+
+import mmap
+
+def mmap_open(filename):
+    f = open(filename,"rb")
+    try:
+        return mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty files can't be mapped
+        return ""
+    finally:
+        f.close()
+
+def mmap_lines(filename):
+    m = mmap_open(filename)
+    if not m: return iter(())
+    return iter(m.readline,"")
+
+def mmap_grep(literal, filename):
+    m = mmap_open(filename)
+    find, rfind, size = m.find, m.rfind, len(m)
+    pos = 0
+    while True:
+        i = find(literal,pos)
+        if i < 0: break
+        start = rfind("\n",0,i) + 1
+        end   = find("\n",i)
+        end   = size if end < 0 else end + 1
+        yield m[start:end]
+        pos = end
+
+# Example use.  bytesgen.py over a single mapped file.
+
+if __name__ == '__main__':
+    from gengrep import gen_grep
+    loglines = mmap_grep("ply-","access-log")
+    patlines = gen_grep(r'ply-.*\.gz',loglines)
+    bytecol  = (line.rsplit(None,1)[1] for line in patlines)
+    bytes    = (int(x) for x in bytecol if x != '-')
+
+    print "Total", sum(bytes)
@@ -14,6 +14,69 @@ def multiplex(sources):
         consumers.append(genfrom_queue(in_q))
     return gen_cat(consumers)
 
+# Multiplex many files on a single thread.  One inotify descriptor
+# watches all of them and only the files that have changed are read.
+# Produces (filename, line) tuples.  With follow=False each file is
+# finished at its end; otherwise a file is finished once it has been
+# deleted and everything left in it has been read.  The generator
+# stops when every file is finished.  Closing it early closes the
+# files and the inotify descriptor.
+
+import os, time
+import inotify
+
+def multiplex_files(filenames, follow=True, timeout=1.0):
+    files   = dict((name, open(name)) for name in filenames)
+    partial = dict((name, "") for name in filenames)
+    if follow:
+        for f in files.values():
+            f.seek(0,2)
+
+    watcher = None
+    try:
+        if follow and inotify.available:
+            watcher = inotify.Inotify()
+            wds = {}
+            for name in files:
+                wd = watcher.add_watch(name, inotify.IN_MODIFY |
+                                       inotify.IN_ATTRIB |
+                                       inotify.IN_DELETE_SELF)
+                wds[wd] = name
+
+        ready = set(files)
+        while files:
+            for name in ready:
+                f = files[name]
+                while True:
+                    line = f.readline()
+                    if not line: break
+                    if not line.endswith("\n"):
+                        partial[name] += line
+                        continue
+                    yield name, partial[name] + line
+                    partial[name] = ""
+                if not follow or os.fstat(f.fileno()).st_nlink == 0:
+                    if partial[name]:
+                        yield name, partial[name]
+                    f.close()
+                    del files[name]
+            if not files: break
+
+            if watcher:
+                events = watcher.wait(timeout)
+                ready = set(wds.get(wd) for wd, mask, cookie, n in events)
+                ready.intersection_update(files)
+                if not events:
+                    ready = set(files)
+            else:
+                time.sleep(0.1)
+                ready = set(files)
+    finally:
+        if watcher:
+            watcher.close()
+        for f in files.values():
+            f.close()
+
 if __name__ == '__main__':
     import follow
     foo_log = follow.follow(open("run/foo/access-log"))
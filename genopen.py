@@ -2,17 +2,39 @@
 #
 # Takes a sequence of filenames as input and yields a sequence of file
 # objects that have been suitably open
+#
+# With readahead=True, compressed files are decompressed on a
+# background thread (see genreadahead.py) and a generator of lines is
+# yielded in place of the file object.
 
 import gzip, bz2
+from genreadahead import readahead as gen_readahead
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
 
-def gen_open(filenames):
+def gen_open(filenames, readahead=False):
     for name in filenames:
         if name.endswith(".gz"):
-            yield gzip.open(name)
+            f = gzip.open(name)
         elif name.endswith(".bz2"):
-            yield bz2.BZ2File(name)
+            f = bz2.BZ2File(name)
+        elif name.endswith(".xz"):
+            if lzma is None:
+                raise RuntimeError("%s: lzma module not available" % name)
+            f = lzma.LZMAFile(name)
         else:
             yield open(name)
+            continue
+        if readahead:
+            yield gen_readahead(f)
+        else:
+            yield f
 
 # Example use
 
@@ -0,0 +1,73 @@
+# genreadahead.py
+#
+# Read a file on a background thread into a bounded queue of large
+# blocks, and split the blocks back into lines on the consuming side.
+# Decompression releases the GIL, so inflating the next block overlaps
+# with whatever the pipeline does with the current one.
+#
+# If the lines aren't read to the end (the generator is closed or
+# dropped), the reader thread is told to stop and closes the file.
+
+import threading, Queue
+import cStringIO
+from genqueue import *
+
+def gen_blocks(f, blocksize=1<<20):
+    while True:
+        block = f.read(blocksize)
+        if not block: break
+        yield block
+
+def block_lines(blocks, stop=None):
+    partial = ""
+    try:
+        for block in blocks:
+            if isinstance(block, Exception):
+                raise block
+            data = partial + block
+            end  = data.rfind("\n") + 1
+            partial = data[end:]
+            for line in cStringIO.StringIO(data[:end]).readlines():
+                yield line
+        if partial:
+            yield partial
+    finally:
+        if stop: stop.set()
+
+def put_unless(thequeue, item, stop, timeout=0.1):
+    # Put item on the queue, waiting for room unless stop gets set.
+    # Returns False if it was stopped.
+    while not stop.is_set():
+        try:
+            thequeue.put(item,True,timeout)
+            return True
+        except Queue.Full:
+            pass
+    return False
+
+def read_blocks(f, blocksize, thequeue, stop):
+    try:
+        for block in gen_blocks(f,blocksize):
+            if not put_unless(thequeue,block,stop): break
+        else:
+            put_unless(thequeue,StopIteration,stop)
+    except Exception, e:
+        put_unless(thequeue,e,stop)
+    finally:
+        f.close()
+
+def readahead(f, blocksize=1<<20, maxblocks=8):
+    block_q = Queue.Queue(maxblocks)
+    stop    = threading.Event()
+    thr = threading.Thread(target=read_blocks,
+                           args=(f,blocksize,block_q,stop))
+    thr.setDaemon(True)
+    thr.start()
+    return block_lines(genfrom_queue(block_q),stop)
+
+# Example use
+
+if __name__ == '__main__':
+    import gzip
+    for line in readahead(gzip.open("access-log.gz")):
+        print line,
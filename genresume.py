@@ -0,0 +1,92 @@
+# genresume.py
+#
+# Run a reduce function over the log files in a directory, saving the
+# byte offset reached and the partial result for each file.  The next
+# run reads only the lines appended since then and merges them into the
+# saved result.  Compressed files can't be resumed mid-stream, so they
+# are reduced again from the start if their size has changed.
+
+import os
+import cPickle as pickle
+from genfind import *
+from genopen import *
+
+def load_checkpoints(filename):
+    try:
+        f = open(filename,"rb")
+    except IOError:
+        return {}
+    try:
+        return pickle.load(f)
+    finally:
+        f.close()
+
+def save_checkpoints(checkpoints, filename):
+    f = open(filename + ".tmp","wb")
+    pickle.dump(checkpoints,f,pickle.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(filename + ".tmp",filename)
+
+def gen_complete_lines(f, pos):
+    # pos is a one item list holding the offset just past the last
+    # complete line handed out.  A partial last line is left for the
+    # next run.
+    for line in f:
+        if not line.endswith("\n"): break
+        pos[0] += len(line)
+        yield line
+
+def resume_file(func, merge, name, offset, state):
+    size = os.path.getsize(name)
+    if name.endswith((".gz",".bz2",".xz")):
+        if size != offset:
+            f = gen_open([name]).next()
+            state, offset = func(f), size
+            f.close()
+        return offset, state
+    if size < offset:
+        # Truncated.  Start over.
+        offset, state = 0, None
+    if size > offset:
+        f = open(name)
+        f.seek(offset)
+        pos = [offset]
+        part = func(gen_complete_lines(f,pos))
+        f.close()
+        state  = part if state is None else merge(state,part)
+        offset = pos[0]
+    return offset, state
+
+def resume_reduce(func, merge, filepat, dirname, checkpointfile):
+    old = load_checkpoints(checkpointfile)
+    new = {}
+    for name in gen_find(filepat,dirname):
+        key = (os.stat(name).st_ino, name)
+        offset, state = old.get(key, (0, None))
+        new[key] = resume_file(func,merge,name,offset,state)
+    save_checkpoints(new,checkpointfile)
+
+    # merge() may update its first argument in place, which is fine
+    # now that the per-file results have been saved
+    total = None
+    for offset, state in new.values():
+        if state is None: continue
+        total = state if total is None else merge(total,state)
+    return total
+
+# Example use.  hosts.py, reading only what's new since the last run.
+
+if __name__ == '__main__':
+    from apachelog import *
+
+    def unique_hosts(lines):
+        return set(r['host'] for r in apache_log(lines))
+
+    def merge_sets(a, b):
+        a |= b
+        return a
+
+    hosts = resume_reduce(unique_hosts, merge_sets,
+                          "access-log*", "www", ".hosts-checkpoint")
+    for h in hosts or ():
+        print h
@@ -0,0 +1,103 @@
+# genscan.py
+#
+# Like gen_find(), but keeps a manifest of what it found last time.
+# Directories whose mtime hasn't changed aren't listed again, and each
+# matching file is reported as 'new', 'grown', 'unchanged' or
+# 'changed' (replaced, truncated or rewritten in place).
+
+import os
+import stat
+import fnmatch
+import cPickle as pickle
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+def list_dir(path):
+    dirs, files = [], []
+    if scandir:
+        for entry in scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    else:
+        for name in os.listdir(path):
+            if stat.S_ISDIR(os.lstat(os.path.join(path,name)).st_mode):
+                dirs.append(name)
+            else:
+                files.append(name)
+    return dirs, files
+
+def new_manifest():
+    return { 'dirs' : {}, 'files' : {} }
+
+def load_manifest(filename):
+    try:
+        f = open(filename,"rb")
+    except IOError:
+        return new_manifest()
+    try:
+        return pickle.load(f)
+    finally:
+        f.close()
+
+def save_manifest(manifest, filename):
+    f = open(filename + ".tmp","wb")
+    pickle.dump(manifest,f,pickle.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(filename + ".tmp",filename)
+
+def scan_find(filepat, top, manifest):
+    olddirs, oldfiles = manifest['dirs'], manifest['files']
+    newdirs, newfiles = {}, {}
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime = os.stat(path).st_mtime
+            cached = olddirs.get(path)
+            if cached and cached[0] == mtime:
+                dirs, files = cached[1], cached[2]
+            else:
+                dirs, files = list_dir(path)
+        except OSError:
+            continue
+        newdirs[path] = (mtime, dirs, files)
+        for name in fnmatch.filter(files,filepat):
+            name = os.path.join(path,name)
+            try:
+                st = os.stat(name)
+            except OSError:
+                continue
+            info = (st.st_size, st.st_mtime, st.st_ino)
+            newfiles[name] = info
+            old = oldfiles.get(name)
+            if old is None:
+                status = 'new'
+            elif old == info:
+                status = 'unchanged'
+            elif old[2] == info[2] and old[0] < info[0]:
+                status = 'grown'
+            else:
+                status = 'changed'
+            yield name, status
+        stack.extend(os.path.join(path,d) for d in reversed(dirs))
+    manifest['dirs'], manifest['files'] = newdirs, newfiles
+
+def gen_scan(filepat, top, manifestfile):
+    manifest = load_manifest(manifestfile)
+    for name, status in scan_find(filepat,top,manifest):
+        yield name, status
+    save_manifest(manifest,manifestfile)
+
+# Example use
+
+if __name__ == '__main__':
+    for name, status in gen_scan("access-log*","www",".genscan"):
+        print status, name
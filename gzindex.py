@@ -0,0 +1,176 @@
+# gzindex.py
+#
+# A sidecar index of restart points in a gzip file, so that pieces of
+# one big compressed log can be decompressed in parallel, or a query
+# can start reading from the middle of the file.
+#
+# zlib in Python can't resume inflating at an arbitrary bit offset, so
+# the restart points are gzip member boundaries.  A gzip file may hold
+# any number of members back to back (gzip.open and zcat read them as
+# one stream).  gzip_blocks() writes a log that way, starting a new
+# member every span bytes at a line boundary.  build_index() finds the
+# member boundaries of any gzip file and keeps one every span bytes.
+
+import os
+import gzip, zlib
+import multiprocessing
+from genreadahead import block_lines
+
+def gzip_blocks(lines, filename, span=16<<20):
+    f = open(filename,"wb")
+    g = gzip.GzipFile(filename,"wb",fileobj=f)
+    size = 0
+    for line in lines:
+        g.write(line)
+        size += len(line)
+        if size >= span and line.endswith("\n"):
+            g.close()
+            g = gzip.GzipFile(filename,"wb",fileobj=f)
+            size = 0
+    g.close()
+    f.close()
+
+def gen_members(f, chunksize=1<<16):
+    # Yields (compressed offset, uncompressed offset, last byte before
+    # the member) for each member, followed by the decompressed blocks
+    # of that member
+    cpos = upos = 0
+    last = "\n"
+    d = zlib.decompressobj(16+zlib.MAX_WBITS)
+    yield (cpos, upos, last)
+    data = f.read(chunksize)
+    while data:
+        block = d.decompress(data)
+        if block:
+            upos += len(block)
+            last  = block[-1]
+            yield block
+        rest = d.unused_data
+        if rest:
+            cpos += len(data) - len(rest)
+            if not rest.strip("\0"): break
+            d = zlib.decompressobj(16+zlib.MAX_WBITS)
+            yield (cpos, upos, last)
+            data = rest
+        else:
+            cpos += len(data)
+            data = f.read(chunksize)
+    block = d.flush()
+    if block:
+        yield block
+
+def build_index(filename, span=16<<20):
+    f = open(filename,"rb")
+    index = []
+    lastu = None
+    for item in gen_members(f):
+        if isinstance(item, tuple):
+            coff, uoff, last = item
+            if last == "\n" and (lastu is None or uoff - lastu >= span):
+                index.append([coff, uoff, None])
+                lastu = uoff
+        elif index[-1][2] is None:
+            # First line of a checkpoint
+            index[-1][2] = item[:item.find("\n")+1] or item
+    f.close()
+    return [tuple(entry) for entry in index if entry[2] is not None]
+
+def write_index(filename, index):
+    f = open(filename + ".gzi","w")
+    for coff, uoff, first in index:
+        f.write("%d %d %s" % (coff, uoff, first))
+        if not first.endswith("\n"):
+            f.write("\n")
+    f.close()
+
+def read_index(filename):
+    index = []
+    for line in open(filename + ".gzi"):
+        coff, uoff, first = line.split(" ",2)
+        index.append((int(coff), int(uoff), first))
+    return index
+
+def load_index(filename, span=16<<20):
+    try:
+        if os.path.getmtime(filename + ".gzi") >= os.path.getmtime(filename):
+            return read_index(filename)
+    except OSError:
+        pass
+    index = build_index(filename,span)
+    write_index(filename,index)
+    return index
+
+def gen_inflate(f, start, end=None, chunksize=1<<16):
+    # Decompressed blocks of the members found between compressed
+    # offsets start and end
+    f.seek(start)
+    d = zlib.decompressobj(16+zlib.MAX_WBITS)
+    pos = start
+    while end is None or pos < end:
+        want = chunksize if end is None else min(chunksize, end - pos)
+        data = f.read(want)
+        if not data: break
+        pos += len(data)
+        while data:
+            block = d.decompress(data)
+            if block: yield block
+            data = d.unused_data
+            if data:
+                if not data.strip("\0"): return
+                d = zlib.decompressobj(16+zlib.MAX_WBITS)
+    block = d.flush()
+    if block: yield block
+
+def gen_checkpoint(filename, start, end=None):
+    f = open(filename,"rb")
+    for line in block_lines(gen_inflate(f,start,end)):
+        yield line
+    f.close()
+
+def checkpoint_ranges(index):
+    starts = [coff for coff, uoff, first in index]
+    return zip(starts, starts[1:] + [None])
+
+def reduce_checkpoint(args):
+    func, filename, start, end = args
+    return func(gen_checkpoint(filename,start,end))
+
+def map_checkpoints(func, filename, index=None, processes=None):
+    if index is None:
+        index = load_index(filename)
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(reduce_checkpoint,
+                           [(func,filename,start,end)
+                            for start,end in checkpoint_ranges(index)])
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+def seek_checkpoint(filename, index, before):
+    # Lines starting from the last checkpoint whose first line
+    # satisfies before(line), e.g. a timestamp earlier than the
+    # start of a time range.
+    lo, hi = 0, len(index)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if before(index[mid][2]):
+            lo = mid + 1
+        else:
+            hi = mid
+    start = index[lo-1][0] if lo else 0
+    return gen_checkpoint(filename,start)
+
+# Example use.  Recompress big-access-log into members of 16MB and sum
+# up the bytes column with one worker per member.
+
+def total_bytes(lines):
+    from apachelog import apache_log
+    return sum(r['bytes'] for r in apache_log(lines))
+
+if __name__ == '__main__':
+    gzip_blocks(open("big-access-log"),"big-access-log.gz")
+    index = load_index("big-access-log.gz")
+    print "Total", sum(map_checkpoints(total_bytes,"big-access-log.gz",index))
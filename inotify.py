@@ -0,0 +1,87 @@
+# inotify.py
+#
+# A small ctypes wrapper around the Linux inotify calls in libc.
+# available is False on systems without inotify, in which case callers
+# should fall back to polling.
+
+import os
+import errno
+import select
+import struct
+import ctypes, ctypes.util
+
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_IGNORED     = 0x00008000
+
+IN_NONBLOCK    = os.O_NONBLOCK
+IN_CLOEXEC     = 0o2000000
+
+try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                       use_errno=True)
+    inotify_init1     = libc.inotify_init1
+    inotify_add_watch = libc.inotify_add_watch
+    inotify_rm_watch  = libc.inotify_rm_watch
+    inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                  ctypes.c_uint32]
+    available = True
+except (OSError, AttributeError):
+    available = False
+
+event_header = struct.Struct("iIII")
+
+def check(result):
+    if result < 0:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+    return result
+
+class Inotify(object):
+    def __init__(self):
+        self.fd = check(inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+    def fileno(self):
+        return self.fd
+    def add_watch(self,path,mask):
+        return check(inotify_add_watch(self.fd,path,mask))
+    def rm_watch(self,wd):
+        check(inotify_rm_watch(self.fd,wd))
+    def read(self):
+        # Returns a list of (wd, mask, cookie, name) for the events
+        # waiting to be read, which may be empty
+        try:
+            data = os.read(self.fd,65536)
+        except OSError, e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, size = event_header.unpack_from(data,pos)
+            pos += event_header.size
+            name = data[pos:pos+size].rstrip("\0")
+            pos += size
+            events.append((wd,mask,cookie,name))
+        return events
+    def wait(self,timeout=None):
+        ready, _, _ = select.select([self.fd],[],[],timeout)
+        return self.read() if ready else []
+    def close(self):
+        os.close(self.fd)
+
+# Example use
+
+if __name__ == '__main__':
+    watcher = Inotify()
+    watcher.add_watch("run/foo", IN_MODIFY | IN_CREATE | IN_MOVED_TO)
+    while True:
+        for event in watcher.wait():
+            print event
@@ -0,0 +1,70 @@
+# linesplit.py
+#
+# Split one large uncompressed log file into byte ranges that start and
+# end on line boundaries, and reduce each range in its own process.
+
+import os
+import multiprocessing
+
+def byte_ranges(filename, n):
+    size = os.path.getsize(filename)
+    f = open(filename,"rb")
+    bounds = [0]
+    for i in xrange(1,n):
+        f.seek(max(size*i//n - 1, bounds[-1]))
+        f.readline()
+        bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    f.close()
+    # An empty file still gets one (empty) range, so func is run once
+    # and the result is whatever func gives for no lines
+    return [(start,end) for start,end in zip(bounds,bounds[1:])
+            if start < end] or [(0,0)]
+
+def gen_range(filename, start, end):
+    f = open(filename,"rb")
+    f.seek(start)
+    pos = start
+    while pos < end:
+        line = f.readline()
+        if not line: break
+        pos += len(line)
+        yield line
+    f.close()
+
+def reduce_range(args):
+    func, filename, start, end = args
+    return func(gen_range(filename,start,end))
+
+def map_ranges(func, filename, n=None, processes=None):
+    n = n or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes or n)
+    try:
+        results = pool.map(reduce_range,
+                           [(func,filename,start,end)
+                            for start,end in byte_ranges(filename,n)])
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+def reduce_ranges(func, merge, filename, n=None, processes=None):
+    return reduce(merge, map_ranges(func,filename,n,processes))
+
+# Example use.  Sum up the bytes column of big-access-log, one range
+# per CPU, and check it against a serial run of the same function.
+
+def total_bytes(lines):
+    from apachelog import apache_log
+    return sum(r['bytes'] for r in apache_log(lines))
+
+if __name__ == '__main__':
+    import operator, tempfile
+    empty = tempfile.NamedTemporaryFile()
+    assert reduce_ranges(total_bytes, operator.add, empty.name) == \
+           total_bytes(open(empty.name)) == 0
+
+    total = reduce_ranges(total_bytes, operator.add, "big-access-log")
+    assert total == total_bytes(open("big-access-log"))
+    print "Total", total
@@ -0,0 +1,59 @@
+# linespool.py
+#
+# Hand each file matching a pattern in a directory to a separate worker
+# process.  The worker runs a reduce function over the lines of that one
+# file and only the partial result is sent back to be merged.
+
+import multiprocessing
+from genfind import *
+from genopen import *
+
+def reduce_file(args):
+    func, name = args
+    f = gen_open([name]).next()
+    try:
+        return name, func(f)
+    finally:
+        f.close()
+
+def map_files(func, filepat, dirname, processes=None, ordered=True):
+    names = gen_find(filepat,dirname)
+    pool  = multiprocessing.Pool(processes)
+    try:
+        if ordered:
+            results = pool.imap(reduce_file, ((func,n) for n in names))
+        else:
+            results = pool.imap_unordered(reduce_file,
+                                          ((func,n) for n in names))
+        for name, result in results:
+            yield name, result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def reduce_from_dir(func, merge, filepat, dirname, initial=None,
+                    processes=None, ordered=True):
+    total = initial
+    for name, result in map_files(func,filepat,dirname,processes,ordered):
+        if total is None:
+            total = result
+        else:
+            total = merge(total,result)
+    return total
+
+# Example use.  func and merge must be picklable, so they are defined
+# at the top level of a module rather than as lambdas.
+
+def unique_hosts(lines):
+    from apachelog import apache_log
+    return set(r['host'] for r in apache_log(lines))
+
+def merge_sets(a, b):
+    a |= b
+    return a
+
+if __name__ == '__main__':
+    hosts = reduce_from_dir(unique_hosts, merge_sets, "access-log*", "www")
+    for h in hosts:
+        print h
@@ -0,0 +1,83 @@
+# logfilter.py
+#
+# Predicates on log records that apache_log(lines, where=[...]) can
+# push down to the raw lines.  Each predicate has an exact test on a
+# parsed record and, where possible, a cheap test on the unparsed line
+# that every line passing the exact test also passes.  Lines failing
+# the cheap test are dropped before they're parsed; the rest are
+# parsed and then checked exactly.  This is what robotsfast.py does
+# by hand with 'robots.txt' in line.
+
+from apachelog import split_tail, bytes_value
+
+class Predicate(object):
+    def __init__(self,name,test,raw=None):
+        self.name = name        # The column tested
+        self.test = test        # Exact test on the column's value
+        self.raw  = raw         # Test on the raw line, or None
+    def __call__(self,r):
+        return self.test(r[self.name])
+
+def tail_bytes(line):
+    # The bytes column of a line, or None if split_tail() can't vouch
+    # for the end of the line
+    t = split_tail(line)
+    if t: return bytes_value(t[1])
+
+def field_is(name, value):
+    if name in ('status','bytes'):
+        # Numeric columns, so field_is('status','404') works too
+        value = int(value)
+    if name == 'status':
+        token = '" %d ' % value
+        raw = lambda line: token in line
+    elif name == 'host':
+        token = value + ' '
+        raw = lambda line: line.startswith(token)
+    elif isinstance(value, str):
+        raw = lambda line: value in line
+    else:
+        raw = None
+    return Predicate(name, lambda v: v == value, raw)
+
+def field_has(name, substring):
+    return Predicate(name, lambda v: substring in v,
+                     lambda line: substring in line)
+
+def field_over(name, n):
+    raw = None
+    if name == 'bytes':
+        def raw(line):
+            b = tail_bytes(line)
+            return b is None or b > n
+    return Predicate(name, lambda v: v > n, raw)
+
+def field_test(name, func):
+    return Predicate(name, func)
+
+def gen_filter(test, items):
+    for item in items:
+        if test(item): yield item
+
+def raw_filter(lines, where):
+    for p in where:
+        if p.raw:
+            lines = gen_filter(p.raw,lines)
+    return lines
+
+def record_filter(log, where):
+    for p in where:
+        log = gen_filter(p,log)
+    return log
+
+# Example use.  largefiles.py with the size test pushed down.
+
+if __name__ == '__main__':
+    from linesdir import *
+    from apachelog import *
+
+    lines = lines_from_dir("access-log*","www")
+    large = apache_log(lines, where=[field_over('bytes',1000000)])
+
+    for r in large:
+        print r['request'],r['bytes']
@@ -0,0 +1,177 @@
+# logformat.py
+#
+# Compile an Apache LogFormat string into a parser for that format.
+#
+# Each directive becomes a regex group and a column name, and numeric
+# columns get an int conversion.  The parser itself is generated
+# Python source for the exact set of columns, so records are built
+# with no per-field loop.  Compiled formats are cached.
+#
+# The common log format compiles to the same regex as apachelog.py's
+# logpat and gives the same records as apache_log().  Note that %l is
+# called 'referrer' there, and that name is kept here.
+
+import re
+
+COMMON   = r'%h %l %u %t "%r" %>s %b'
+COMBINED = COMMON + r' "%{Referer}i" "%{User-agent}i"'
+
+names = {
+    'a' : 'remote_ip',   'A' : 'local_ip',    'B' : 'bytes',
+    'b' : 'bytes',       'D' : 'time_us',     'f' : 'filename',
+    'H' : 'proto',       'h' : 'host',        'I' : 'bytes_in',
+    'k' : 'keepalive',   'L' : 'log_id',      'l' : 'referrer',
+    'm' : 'method',      'O' : 'bytes_out',   'P' : 'pid',
+    'p' : 'port',        'q' : 'query',       'R' : 'handler',
+    's' : 'status',      'S' : 'bytes_total', 'T' : 'time_s',
+    't' : 'datetime',    'U' : 'url',         'u' : 'user',
+    'V' : 'server_name', 'v' : 'vhost',       'X' : 'conn_status',
+}
+
+# Directives whose value is a number ('-' counts as 0)
+numeric = set('BbDIkOPpSsT')
+
+# Directives that name something in braces, e.g. %{User-agent}i
+braced = set('iocneC')
+
+directive = re.compile(r'%[<>]?(?:!?\d+(?:,\d+)*)?(?:\{([^}]*)\})?[<>]?'
+                       r'([a-zA-Z%])')
+
+def to_int(s):
+    return int(s) if s != '-' else 0
+
+def time_pattern(arg):
+    # A group for a time written with %{arg}t.  The time has a space
+    # wherever the strftime format does (%c and %r contain some of
+    # their own), so it's that many runs of non-space characters.
+    fmt = re.sub(r'^(begin|end):','',arg).replace('%%','')
+    spaces = fmt.count(' ') + 4*fmt.count('%c') + fmt.count('%r')
+    return r'(\S+' + r'(?: +\S+)'*spaces + ')'
+
+def literal(text):
+    return ''.join('\\' + c if c in '.^$*+?{}[]\\|()' else c
+                   for c in text)
+
+class LogFormat(object):
+    def __init__(self,fmt):
+        self.format = fmt
+        fmt = fmt.replace('\\"','"').replace('\\t','\t')
+        pieces, colnames, numbers = [], [], []
+        def column(name):
+            n, base = 2, name
+            while name in colnames:
+                name = '%s_%d' % (base,n)
+                n += 1
+            colnames.append(name)
+            return name
+        pos = 0
+        for m in directive.finditer(fmt):
+            pieces.append(literal(fmt[pos:m.start()]))
+            pos = m.end()
+            arg, d = m.groups()
+            quoted = fmt[m.start()-1:m.start()] == '"' and \
+                     fmt[m.end():m.end()+1] == '"'
+            if d == '%':
+                pieces.append('%')
+            elif d == 'r':
+                pieces.append(r'(\S+) (\S+) (\S+)')
+                for name in ('method','request','proto'):
+                    column(name)
+            elif d == 't' and not arg:
+                pieces.append(r'\[(.*?)\]')
+                column('datetime')
+            elif d == 't':
+                pieces.append(time_pattern(arg))
+                column('datetime')
+            else:
+                if d in braced and arg:
+                    name = re.sub(r'\W','_',arg.lower())
+                elif d in names:
+                    name = names[d]
+                else:
+                    raise ValueError("unknown directive %r in %r"
+                                     % (m.group(),self.format))
+                if quoted:
+                    pieces.append(r'((?:[^"\\]|\\.)*)')
+                else:
+                    pieces.append(r'(\S+)')
+                name = column(name)
+                if d in numeric:
+                    numbers.append(name)
+        pieces.append(literal(fmt[pos:]))
+        self.pattern  = ''.join(pieces)
+        self.regex    = re.compile(self.pattern)
+        self.colnames = tuple(colnames)
+        self.numeric  = tuple(numbers)
+        self.parse_dicts, self.parse_records = self.make_parsers()
+
+    def make_parsers(self):
+        fields = ['f%d' % i for i in range(len(self.colnames))]
+        values = ['to_int(%s)' % f if name in self.numeric else f
+                  for f, name in zip(fields,self.colnames)]
+        src = ("def parse_dicts(lines):\n"
+               "    for line in lines:\n"
+               "        g = match(line)\n"
+               "        if g:\n"
+               "            %s, = g.groups()\n"
+               "            yield {%s}\n"
+               "def parse_records(lines, record):\n"
+               "    for line in lines:\n"
+               "        g = match(line)\n"
+               "        if g:\n"
+               "            %s, = g.groups()\n"
+               "            yield record(%s)\n") % (
+            ", ".join(fields),
+            ", ".join("%r : %s" % (name, v)
+                      for name, v in zip(self.colnames,values)),
+            ", ".join(fields),
+            ", ".join(values))
+        namespace = { 'match' : self.regex.match, 'to_int' : to_int }
+        exec src in namespace
+        return namespace['parse_dicts'], namespace['parse_records']
+
+    def parse(self,lines,record=dict):
+        if record is dict:
+            return self.parse_dicts(lines)
+        return self.parse_records(lines,record)
+
+formats = {}
+
+def compile_format(fmt):
+    f = formats.get(fmt)
+    if f is None:
+        f = formats[fmt] = LogFormat(fmt)
+    return f
+
+def format_log(lines, fmt=COMMON, record=dict):
+    return compile_format(fmt).parse(lines,record)
+
+# Example use
+
+if __name__ == '__main__':
+    from apachelog import *
+    assert compile_format(COMMON).pattern == logpats
+
+    # Times in a format of their own, with spaces in them
+    iso = compile_format(r'%h [%{%Y-%m-%d %H:%M:%S}t] "%r" %>s %b')
+    r, = iso.parse(['1.2.3.4 [2008-02-24 00:00:00] "GET / HTTP/1.1" 200 5\n'])
+    assert r['datetime'] == '2008-02-24 00:00:00' and r['bytes'] == 5
+    last = compile_format(r'%h %>s %{%d %b %Y}t')
+    r, = last.parse(['1.2.3.4 200 24 Feb 2008\n'])
+    assert r['datetime'] == '24 Feb 2008', r
+    bare = compile_format(r'%h %{%d/%b/%Y:%H:%M:%S %z}t %>s')
+    r, = bare.parse(['1.2.3.4 24/Feb/2008:00:00:00 -0600 200\n'])
+    assert r['datetime'] == '24/Feb/2008:00:00:00 -0600', r
+    assert r['status'] == 200, r
+    ctime = compile_format(r'%{begin:%c}t %h')
+    r, = ctime.parse(['Sun Feb 24 00:00:00 2008 1.2.3.4\n'])
+    assert r['datetime'] == 'Sun Feb 24 00:00:00 2008' and r['host'] == '1.2.3.4'
+
+    assert list(format_log(open("access-log"))) == \
+           list(apache_log(open("access-log")))
+
+    vhost = compile_format(r'%v %h %l %u %t \"%r\" %>s %b '
+                           r'\"%{Referer}i\" \"%{User-agent}i\" %D')
+    print vhost.colnames
+    for r in vhost.parse(open("run/vhosts/access-log")):
+        print r['vhost'], r['request'], r['time_us']
@@ -0,0 +1,171 @@
+# logmulti.py
+#
+# Run several queries from logquery.py over a single scan of the logs.
+# The lines are read and parsed once, with the union of the columns
+# the queries need, and each record is broadcast to one consumer
+# co-routine per query (as in logcoroutine.py).  When the scan is done
+# the consumers are closed and each leaves its result behind.
+
+from operator import itemgetter
+from consumer import *
+from broadcast import *
+from linesdir import *
+from apachelog import *
+from logquery import *
+
+@consumer
+def query_sink(query, results, name):
+    # Receives records and, when closed, stores the query's result
+    # rows as results[name]
+    query.check()
+    where   = query.predicates
+    grouped = bool(query.groups or query.aggregates)
+    columns = query.outputs()
+    if len(columns) == 1:
+        column = columns[0]
+        pick = lambda r: (r[column],)
+    elif columns:
+        pick = itemgetter(*columns)
+    groups, rows, seen = {}, [], set()
+    # With an order and a limit, only the best rows so far are kept.
+    # Once there are enough of them, a record that sorts after the
+    # worst one on the first key can be skipped.
+    cutoff = None
+    if query.count is not None and query.ordering:
+        keep  = 2*query.count + 1024
+        first = query.ordering[0].lstrip('-')
+        desc  = query.ordering[0][0] == '-'
+    try:
+        while True:
+            r = (yield)
+            for p in where:
+                if not p(r): break
+            else:
+                if grouped:
+                    query.add(groups,r)
+                    continue
+                if cutoff is not None:
+                    v = r[first]
+                    if (v < cutoff) if desc else (v > cutoff): continue
+                if columns:
+                    k = pick(r)
+                    if query.unique:
+                        if k in seen: continue
+                        seen.add(k)
+                    r = dict(zip(columns,k))
+                elif query.unique:
+                    k = tuple(sorted(r.items()))
+                    if k in seen: continue
+                    seen.add(k)
+                if query.count is None:
+                    rows.append(r)
+                elif not query.ordering:
+                    if len(rows) < query.count: rows.append(r)
+                else:
+                    rows.append(r)
+                    if len(rows) >= keep:
+                        rows = list(query.ordered(iter(rows)))
+                        if len(rows) == query.count:
+                            cutoff = rows[-1][first]
+    except GeneratorExit:
+        if grouped:
+            rows = query.group_rows(groups)
+            if query.unique:
+                rows = query.deduped(rows)
+        results[name] = list(query.ordered(iter(rows)))
+
+class QuerySet(object):
+    def __init__(self):
+        self.queries = []
+
+    def register(self,name,query):
+        self.queries.append((name,query))
+        return query
+
+    def fields(self):
+        # Columns for the shared parse, or None if a query needs them all
+        needed = []
+        for name, q in self.queries:
+            fields = q.fields()
+            if fields is None:
+                return None
+            needed.extend(fields)
+            needed.extend(p.name for p in q.predicates)
+        return [c for i, c in enumerate(needed) if c not in needed[:i]]
+
+    def raw_test(self):
+        # A line can be dropped unparsed if every query's raw tests
+        # reject it.  Only possible if each query has a raw test.
+        tests = []
+        for name, q in self.queries:
+            raws = [p.raw for p in q.predicates if p.raw]
+            if not raws:
+                return None
+            tests.append(raws)
+        def test(line):
+            for raws in tests:
+                for raw in raws:
+                    if not raw(line): break
+                else:
+                    return True
+            return False
+        return test
+
+    def execute(self,lines):
+        results = {}
+        sinks   = [query_sink(q,results,name) for name, q in self.queries]
+        test    = self.raw_test()
+        if test:
+            lines = (line for line in lines if test(line))
+        broadcast(apache_log(lines, fields=self.fields()), sinks)
+        for c in sinks:
+            c.close()
+        return results
+
+    def run(self,filepat="access-log*",dirname="www"):
+        return self.execute(lines_from_dir(filepat,dirname))
+
+# Example use.  hosts.py, query404.py, largest.py and robots.py in one
+# pass over the logs.
+
+if __name__ == '__main__':
+    from logfilter import *
+
+    # Each query gives the same rows in a QuerySet as on its own, so
+    # the other queries (and the columns they need) make no difference
+    lines = ['1.2.3.%d - - [24/Feb/2008:00:00:00 -0600] "GET /p%d HTTP/1.1" %d %d\n'
+             % (i % 5, i % 7, (200,404)[i % 2], i*100) for i in range(40)]
+    lines += ['1.2.3.8 - - [24/Feb/2008:00:00:00 -0600] "-" 408 -\n',
+              '1.2.3.9 - - [24/Feb/2008:00:00:00 -0600] "\x16\x03\x01" 400 226\n',
+              '1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /c HTTP/1.1" 200 5 "-" "x"\n']
+    checks = [lambda: Query().select('host').distinct(),
+              lambda: Query().select('request').where(field_is('status',404))
+                             .distinct(),
+              lambda: Query().select('request').order_by('-bytes').limit(3),
+              lambda: Query().where(field_over('bytes',1000))
+                             .aggregate(n=count(),sent=total('bytes')),
+              lambda: Query().group_by('status').aggregate(n=count())
+                             .order_by('status'),
+              lambda: Query().select('host').limit(4)]
+    together = QuerySet()
+    for i, make in enumerate(checks):
+        together.register(i,make())
+    results = together.execute(lines)
+    for i, make in enumerate(checks):
+        alone = list(make().execute(lines))
+        assert sorted(results[i]) == sorted(alone), (i, results[i], alone)
+
+    reports = QuerySet()
+    reports.register("hosts",   Query().select('host').distinct())
+    reports.register("404",     Query().select('request')
+                                       .where(field_is('status',404))
+                                       .distinct().order_by('request'))
+    reports.register("largest", Query().select('bytes','request')
+                                       .order_by('-bytes').limit(1))
+    reports.register("robots",  Query().select('host')
+                                       .where(field_has('request','robots.txt'))
+                                       .distinct())
+
+    results = reports.run()
+    for name in sorted(results):
+        print name, len(results[name]), results[name][:3]
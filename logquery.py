@@ -0,0 +1,252 @@
+# logquery.py
+#
+# A small query layer over apache_log().  A query is built up with
+# select, where, group_by, aggregate, order_by and limit, and is then
+# compiled into a generator pipeline.  The columns the query uses are
+# passed down to apache_log() as a projection and its predicates (from
+# logfilter.py) as a pushed-down filter, so every query gets the cheap
+# parsing paths without having to ask for them.
+
+import heapq
+from itertools import islice
+from operator import itemgetter
+from linesdir import *
+from apachelog import *
+from hyperloglog import HyperLogLog
+
+# Aggregates.  Each keeps one state per group: start() makes a new
+# state, update() folds in a record's value and result() gives the
+# final answer.
+
+class Aggregate(object):
+    def __init__(self,column,start,update,result=None):
+        self.column = column
+        self.start  = start
+        self.update = update
+        self.result = result or (lambda state: state)
+
+def count():
+    return Aggregate(None, lambda: 0, lambda state, v: state + 1)
+
+def total(column):
+    return Aggregate(column, lambda: 0, lambda state, v: state + v)
+
+def largest(column):
+    return Aggregate(column, lambda: None,
+                     lambda state, v: v if state is None else max(state,v))
+
+def smallest(column):
+    return Aggregate(column, lambda: None,
+                     lambda state, v: v if state is None else min(state,v))
+
+def distinct(column):
+    def update(state, v):
+        state.add(v)
+        return state
+    return Aggregate(column, set, update, len)
+
+def approx_distinct(column, p=12):
+    # distinct() in 2**p bytes per group, to within about 1.04/sqrt(2**p)
+    def update(state, v):
+        state.add(v)
+        return state
+    return Aggregate(column, lambda: HyperLogLog(p), update,
+                     HyperLogLog.count)
+
+class Query(object):
+    def __init__(self):
+        self.columns    = ()
+        self.predicates = []
+        self.groups     = ()
+        self.aggregates = []
+        self.unique     = False
+        self.ordering   = ()
+        self.count      = None
+
+    def select(self,*columns):
+        self.columns = columns
+        return self
+    def where(self,*predicates):
+        self.predicates.extend(predicates)
+        return self
+    def group_by(self,*columns):
+        self.groups = columns
+        return self
+    def aggregate(self,**aggregates):
+        self.aggregates.extend(sorted(aggregates.items()))
+        return self
+    def distinct(self):
+        self.unique = True
+        return self
+    def order_by(self,*keys):
+        # A key of '-name' sorts in descending order
+        self.ordering = keys
+        return self
+    def limit(self,n):
+        self.count = n
+        return self
+
+    def outputs(self):
+        # The columns of each selected row: those asked for, plus any
+        # the rows are ordered by
+        names = list(self.columns)
+        if names:
+            names.extend(k.lstrip('-') for k in self.ordering
+                         if k.lstrip('-') not in names)
+        return names
+
+    def check(self):
+        # Grouped rows only hold the group columns and the aggregates.
+        # Distinct rows are distinct in the selected columns, so there
+        # is no one value of any other column to order them by.
+        if self.groups or self.aggregates:
+            names = set(self.groups) | set(n for n, a in self.aggregates)
+            for k in self.ordering:
+                if k.lstrip('-') not in names:
+                    raise ValueError("can't order by %r: not a group "
+                                     "column or an aggregate" % k)
+        elif self.unique and self.columns:
+            for k in self.ordering:
+                if k.lstrip('-') not in self.columns:
+                    raise ValueError("can't order distinct rows by %r: "
+                                     "not a selected column" % k)
+
+    def fields(self):
+        # The columns apache_log() has to produce, or None for all
+        if self.groups or self.aggregates:
+            needed = list(self.groups)
+            needed.extend(a.column for name, a in self.aggregates
+                          if a.column)
+        else:
+            needed = self.outputs()
+        if not needed:
+            if not self.aggregates:
+                return None
+            # Only counting.  A projection gives the same lines as the
+            # full parse, so any one column will do.
+            needed = [p.name for p in self.predicates] or ['status']
+        return [c for i, c in enumerate(needed) if c not in needed[:i]]
+
+    def execute(self,lines):
+        self.check()
+        log = apache_log(lines, fields=self.fields(),
+                         where=self.predicates or None)
+        if self.groups or self.aggregates:
+            rows = self.grouped(log)
+        elif self.columns:
+            names = self.outputs()
+            rows = (dict((c, r[c]) for c in names) for r in log)
+        else:
+            rows = log
+        if self.unique:
+            rows = self.deduped(rows)
+        return self.ordered(rows)
+
+    def run(self,filepat="access-log*",dirname="www"):
+        return self.execute(lines_from_dir(filepat,dirname))
+
+    def grouped(self,log):
+        groups = {}
+        for r in log:
+            self.add(groups,r)
+        return self.group_rows(groups)
+
+    def add(self,groups,r):
+        # Fold one record into the per-group aggregate states
+        k = self.key(r)
+        states = groups.get(k)
+        if states is None:
+            states = groups[k] = [a.start() for n, a in self.aggregates]
+        for i, (name, a) in enumerate(self.aggregates):
+            states[i] = a.update(states[i], r[a.column] if a.column else None)
+
+    def key(self,r):
+        return tuple(r[c] for c in self.groups)
+
+    def group_rows(self,groups):
+        if not groups and not self.groups:
+            groups[()] = [a.start() for n, a in self.aggregates]
+        for k, states in groups.iteritems():
+            row = dict(zip(self.groups,k))
+            for (name, a), state in zip(self.aggregates, states):
+                row[name] = a.result(state)
+            yield row
+
+    def deduped(self,rows):
+        seen = set()
+        for row in rows:
+            k = tuple(sorted(row.items()))
+            if k not in seen:
+                seen.add(k)
+                yield row
+
+    def ordered(self,rows):
+        if not self.ordering:
+            return islice(rows,self.count) if self.count is not None else rows
+        if len(self.ordering) == 1:
+            name = self.ordering[0]
+            key  = itemgetter(name.lstrip('-'))
+            if self.count is not None:
+                # Only the top rows are kept while scanning
+                pick = heapq.nlargest if name[0] == '-' else heapq.nsmallest
+                return iter(pick(self.count,rows,key=key))
+            return iter(sorted(rows,key=key,reverse=name[0] == '-'))
+        rows = list(rows)
+        for name in reversed(self.ordering):
+            rows.sort(key=itemgetter(name.lstrip('-')),
+                      reverse=name[0] == '-')
+        return iter(rows[:self.count] if self.count is not None else rows)
+
+# Example use.  The questions answered by hosts.py, query404.py,
+# largest.py, largefiles.py and downloads.py.
+
+if __name__ == '__main__':
+    from logfilter import *
+
+    # Counting sees the same lines as grouping, and rows carry the
+    # columns they're ordered by
+    lines = ['1.2.3.4 - - [24/Feb/2008:00:00:00 -0600] "GET /x HTTP/1.1" 200 12\n',
+             '1.2.3.5 - - [24/Feb/2008:00:00:00 -0600] "-" 408 -\n',
+             '1.2.3.7 - - [24/Feb/2008:00:00:00 -0600] "POST /y HTTP/1.1" 200 99\n']
+    n, = Query().aggregate(n=count()).execute(lines)
+    assert n['n'] == sum(r['n'] for r in Query().group_by('method')
+                                              .aggregate(n=count())
+                                              .execute(lines)) == 2
+    assert [r['request'] for r in Query().select('request')
+                                         .order_by('-bytes').limit(1)
+                                         .execute(lines)] == ['/y']
+    try:
+        Query().select('host').distinct().order_by('-bytes').execute(lines)
+        assert False
+    except ValueError:
+        pass
+
+    hosts = Query().select('host').distinct()
+    for r in hosts.run():
+        print r['host']
+
+    stat404 = Query().select('request').where(field_is('status',404)) \
+                     .distinct().order_by('request')
+    for r in stat404.run():
+        print r['request']
+
+    largest = Query().select('bytes','request') \
+                     .order_by('-bytes').limit(1)
+    for r in largest.run():
+        print "%d %s" % (r['bytes'],r['request'])
+
+    large = Query().select('request','bytes') \
+                   .where(field_over('bytes',1000000))
+    for r in large.run():
+        print r['request'],r['bytes']
+
+    downloads = Query().where(field_is('request','/ply/ply-2.3.tar.gz')) \
+                       .aggregate(total=count())
+    for r in downloads.run():
+        print "Total", r['total']
+
+    top = Query().group_by('host').aggregate(hits=count(),
+                                             sent=total('bytes')) \
+                 .order_by('-sent').limit(10)
+    for r in top.run():
+        print r['host'], r['hits'], r['sent']
@@ -0,0 +1,157 @@
+# topk.py
+#
+# Heavy hitters in bounded memory (the Space-Saving algorithm).  At
+# most capacity items are counted.  When a new item arrives and the
+# table is full, the item with the smallest count is replaced and the
+# newcomer takes over its count, which is remembered as the error.
+#
+# For every item kept, count - error <= true count <= count, and the
+# error is never more than total/capacity.  Any item whose true count
+# is above total/capacity is certain to be in the table.  Items can
+# carry a weight (e.g. bytes) instead of counting 1 each.
+#
+# Tables can be merged, so shards or files can be counted separately.
+
+import heapq
+from consumer import *
+
+class SpaceSaving(object):
+    def __init__(self,capacity=1000):
+        self.capacity = capacity
+        self.counts   = {}
+        self.errors   = {}
+        self.heap     = []          # (count, item), counts may be stale
+        self.total    = 0
+
+    def add(self,item,weight=1):
+        self.total += weight
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+            heapq.heappush(self.heap,(weight,item))
+        else:
+            low, old = self.evict()
+            counts[item] = low + weight
+            self.errors[item] = low
+            heapq.heappush(self.heap,(low + weight,item))
+
+    def evict(self):
+        # Remove the item with the smallest count.  Counts only go up,
+        # so an entry whose count is out of date goes back in with the
+        # current count.
+        heap, counts = self.heap, self.counts
+        while True:
+            c, item = heap[0]
+            if counts[item] == c:
+                heapq.heappop(heap)
+                del counts[item]
+                del self.errors[item]
+                return c, item
+            heapq.heapreplace(heap,(counts[item],item))
+
+    def update(self,items):
+        for item in items:
+            self.add(item)
+        return self
+
+    def minimum(self):
+        # The count a missing item could have had
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.itervalues())
+
+    def bound(self):
+        # Largest possible overcount of any item
+        return self.total // self.capacity if self.capacity else 0
+
+    def top(self,n=None):
+        # [(item, count, error)] with the largest counts first
+        items = sorted(self.counts.iteritems(),
+                       key=lambda item: item[1], reverse=True)[:n]
+        return [(item, c, self.errors[item]) for item, c in items]
+
+    def guaranteed(self,n=None):
+        # The items from top(n) that are certain to belong there: their
+        # lowest possible count beats the count of everything after them
+        top  = self.top()
+        rest = [c for item, c, e in top[n:]] if n is not None else []
+        next = max(rest + [self.minimum()])
+        return [(item, c, e) for item, c, e in top[:n] if c - e >= next]
+
+    def merge(self,other):
+        # An item missing from one table may have had up to that
+        # table's minimum count there, so that much is added to both
+        # its count and its error
+        m1, m2 = self.minimum(), other.minimum()
+        counts, errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = (self.counts.get(item,m1) +
+                            other.counts.get(item,m2))
+            errors[item] = (self.errors.get(item,m1) +
+                            other.errors.get(item,m2))
+        keep = heapq.nlargest(self.capacity,counts.iteritems(),
+                              key=lambda item: item[1])
+        self.counts = dict(keep)
+        self.errors = dict((item, errors[item]) for item, c in keep)
+        self.heap   = [(c, item) for item, c in keep]
+        heapq.heapify(self.heap)
+        self.total += other.total
+        return self
+
+    def __len__(self):
+        return len(self.counts)
+
+# Consumers.  topk_sink() counts each item sent; weighted_sink() takes
+# (item, weight) pairs.  The caller keeps the table.
+
+@consumer
+def topk_sink(table):
+    while True:
+        table.add((yield))
+
+@consumer
+def weighted_sink(table):
+    while True:
+        item, weight = (yield)
+        table.add(item,weight)
+
+# Example use.  The most requested URLs and the top talkers by bytes,
+# per file in separate processes, and then live from a followed log.
+
+def top_requests(lines):
+    from apachelog import apache_log
+    return SpaceSaving(100).update(r['request']
+                                   for r in apache_log(lines,fields=['request']))
+
+def merge_tables(a, b):
+    return a.merge(b)
+
+if __name__ == '__main__':
+    from linesdir import *
+    from apachelog import *
+    from broadcast import *
+    from linespool import *
+
+    table = reduce_from_dir(top_requests, merge_tables, "access-log*", "www")
+    for request, count, error in table.guaranteed(10):
+        print "%8d %s" % (count, request)
+
+    lines   = lines_from_dir("access-log*","www")
+    talkers = SpaceSaving(1000)
+    traffic = ((r['host'],r['bytes'])
+               for r in apache_log(lines,fields=['host','bytes']))
+    broadcast(traffic,[weighted_sink(talkers)])
+    for host, sent, error in talkers.top(10):
+        print "%-20s %12d (+/- %d)" % (host, sent, error)
+
+    from follow import *
+    live  = SpaceSaving(100)
+    sink  = topk_sink(live)
+    log   = apache_log(follow_name("run/foo/access-log"),fields=['request'])
+    for n, r in enumerate(log):
+        sink.send(r['request'])
+        if n % 1000 == 999:
+            print live.top(5)